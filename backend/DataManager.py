@@ -3,19 +3,53 @@ Author: AmplifiQation
 
 iQuHACK 2023
 """
-from typing import Dict
+import os
+from typing import Dict, List, Optional
 
 import pandas
-# import covalent as ct
+from pandas import DataFrame
+import covalent as ct
 import numpy as np
-import sklearn
-from sklearn.neighbors import DistanceMetric
 
-from backend.hamiltonian_cycles import hamiltonian_cycle
+from hamiltonian_cycles import hamiltonian_cycle, k_nearest_adjacency, threshold_adjacency
+from local_executor import LocalExecutor
 from randomizer import RNG
-from Typing import Dict
 
-IBM_QUANTUM_TOKEN = '9e7bde2b4061405bfd573264c0b7782d144c344aaa91cd8632cd492dff71254520bdd5c5f5a1726e35d66f5e4cdc8d411698fc0424e3253436eabf817671f72d'
+# Hamiltonian cycles costed per task when the costing is spread over an executor.
+CYCLE_CHUNK_SIZE = 4096
+
+@ct.electron
+def draw_random_event(backend: int, token: str, num_qubits: int) -> int:
+    """
+    Draws one random event index with the Quantum RNG.
+    :param backend: int
+        See RNG.
+    :param token: str
+        IBM API to connect to QC
+    :param num_qubits: int
+        Number of qubits to use to get a random binary string
+    :return: int:
+        Random number
+    """
+    return RNG(backend, token).randomizer_circuit(num_qubits)
+
+
+@ct.electron
+def cycle_costs(cost_matrix, cycles: List[str]) -> List[float]:
+    """
+    Computes the cost of each Hamiltonian cycle.
+    :param cost_matrix:
+        Cost Matrix of the events
+    :param cycles: List[str]
+        Hamiltonian cycles, as space separated stops
+    :return: List[float]:
+        The cost of each cycle
+    """
+    costs = []
+    for cycle in cycles:
+        stops = [int(stop) for stop in cycle.split(" ")]
+        costs.append(sum(cost_matrix[stops[j], stops[j + 1]] for j in range(len(stops) - 1)))
+    return costs
 
 
 class DataManager:
@@ -23,18 +57,24 @@ class DataManager:
     Generates a dict of costs
     events: Pandas.DataFrame
         A pandas df of events
+    executor: LocalExecutor
+        Runs independent electrons in parallel, None to run everything here.
     """
     df: DataFrame
     rng: RNG
+    executor: Optional[LocalExecutor]
 
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str, executor: Optional[LocalExecutor] = None):
         """
         Initialization of DataManager Class
         :param in_file: str
             string of file path
+        :param executor: LocalExecutor (optional; default is None)
+            Executor for the random event draws and the cycle costing
         """
         # TODO: Interface with Google maps
         self.df = pandas.read_csv(filepath)
+        self.executor = executor
 
     def _generate_data(self):
         """
@@ -65,88 +105,114 @@ class DataManager:
             Data frame of desired events
 
         """
-        token = os.environ[IBM_QUANTUM_TOKEN]
+        token = os.environ["IBM_QUANTUM_TOKEN"]
         backend = 2
-        self.rng = RNG(backend, token)
         binary_len = len(format(num_event, 'b'))
 
         if 2**binary_len - 1 > num_event:
             binary_len -= 1
 
-        temp_lst = []
-        for i in range(num_event):
-            temp_lst.append(self.rng.randomizer_circuit(binary_len))
+        if self.executor is not None:
+            # The draws are independent, so make them side by side.
+            draws = [self.executor.submit_uncached(draw_random_event, backend, token, binary_len)
+                     for _ in range(num_event)]
+            temp_lst = [draw.result() for draw in draws]
+        else:
+            self.rng = RNG(backend, token)
+            temp_lst = []
+            for i in range(num_event):
+                temp_lst.append(self.rng.randomizer_circuit(binary_len))
 
         temp_df = self.df_new.filter(items=temp_lst, axis=0)
 
         return temp_df
 
+    def _get_selected_events(self, location_ids: List[int]):
+        """
+        Selects the events with the given ids (row indices of the catalogue),
+        in the given order.
+        :param location_ids: List[int]
+            Ids of the events to pick
+        :return: Pandas.DataFrame:
+            Data frame of desired events
+        """
+        unknown_ids = [i for i in location_ids if i not in self.df_new.index]
+        if unknown_ids:
+            raise ValueError(f"unknown location ids {unknown_ids}")
+
+        return self.df_new.loc[list(location_ids)]
+
     @ct.electron
-    def build_cost_matrix(self, num_event: int) -> List[List]:
+    def build_cost_matrix(self, num_event: int, location_ids: List[int] = None) -> List[List]:
         """
         Builds a matrix of all distances between any two events of size
         <num_events>
         :param num_event:
             Size of matrix to generate
+        :param location_ids: List[int] (optional; default is None)
+            Use these events, in this order, instead of <num_event> random ones
         :return:
             Cost Matrix of desired size
         """
         self._generate_data()
         self._convert_to_rad()
-        temp_df = self._get_random_events(num_event)
-        dist = sklearn.neighbors.DistanceMetric.get_metric('haversine')
+        if location_ids is not None:
+            temp_df = self._get_selected_events(location_ids)
+        else:
+            temp_df = self._get_random_events(num_event)
+
+        # scikit-learn is slow to import, so only load it when we need a cost matrix.
+        from sklearn.neighbors import DistanceMetric
+
+        dist = DistanceMetric.get_metric('haversine')
         d = dist.pairwise(temp_df[['lat_radians', 'long_radians']],
                           temp_df[['lat_radians', 'long_radians']])
         return d
 
-    def build_hamiltonian_cycle_dict(self, n_events: int = 5) -> Dict[str, float]:
+    def build_hamiltonian_cycle_dict(self, n_events: int = 5, k_nearest: int = None,
+                                     max_distance: float = None,
+                                     location_ids: List[int] = None) -> Dict[str, float]:
         """
         Build a dictionary of Hamiltonian cycles.
 
         :param n_events: int (optional; default is 5):
             The number of events to use.
+        :param k_nearest: int (optional; default is None):
+            Only search tours along edges to each event's k nearest neighbours.
+        :param max_distance: float (optional; default is None):
+            Only search tours along edges no longer than this (haversine
+            distance, in radians). Ignored if k_nearest is given.
+        :param location_ids: List[int] (optional; default is None):
+            Use these events instead of n_events random ones. Stop i of a
+            cycle is then location_ids[i].
 
         :return: dict:
             keyed by the Hamiltonian cycles (as strings)
             values are the costs (as floats)
 
         """
-        cost_matrix = self.build_cost_matrix(n_events)
-        # Generate Hamiltonian cycles in file
-        hamiltonian_cycle(cost_matrix)
-
-        # Read in Hamiltonian cycles from file
-        import pathlib
-        ham_cycle_in_dir = str(pathlib.Path().resolve().parent.resolve()) + "\\data"
-        ham_cycle_in_file = ham_cycle_in_dir + "\\hamiltonian_cycles_temp.txt"
-
-        my_file = open(ham_cycle_in_file, 'r')
-        lines = my_file.readlines()
-
-        # Build up an array of Hamiltonian cycles.
-        hamiltonian_cycle_arr = []
-        for line in lines:
-            hamiltonian_cycle_arr.append(line.strip())  # Strip the newline characters.
-
-        # Compute costs for each cycle.
-        costs = [0] * len(hamiltonian_cycle_arr)
-        for i, cycle in enumerate(hamiltonian_cycle_arr):
-            stops = cycle.split(" ")
-            len_stops = len(stops)
-
-            for j, stop in enumerate(stops):
-                if j < len_stops - 1:
-                    costs[i] += cost_matrix[int(stops[j]), int(stops[j + 1])]
+        cost_matrix = self.build_cost_matrix(n_events, location_ids=location_ids)
+
+        # Optionally sparsify the graph, otherwise every pair of events is an edge.
+        adjacency = None
+        if k_nearest is not None:
+            adjacency = k_nearest_adjacency(cost_matrix, k_nearest)
+        elif max_distance is not None:
+            adjacency = threshold_adjacency(cost_matrix, max_distance)
+
+        hamiltonian_cycle_arr = hamiltonian_cycle(cost_matrix, adjacency=adjacency)
+
+        # Compute costs for each cycle, in chunks spread over the executor if we have one.
+        if self.executor is not None:
+            chunks = [hamiltonian_cycle_arr[i:i + CYCLE_CHUNK_SIZE]
+                      for i in range(0, len(hamiltonian_cycle_arr), CYCLE_CHUNK_SIZE)]
+            chunk_costs = [self.executor.submit(cycle_costs, cost_matrix, chunk) for chunk in chunks]
+            costs = [cost for chunk in chunk_costs for cost in chunk.result()]
+        else:
+            costs = cycle_costs(cost_matrix, hamiltonian_cycle_arr)
 
         # Build a dictionary.
-        res = {}
-        for key in hamiltonian_cycle_arr:
-            for value in costs:
-                res[key] = value
-                costs.remove(value)
-                break
-
-        return res
+        return dict(zip(hamiltonian_cycle_arr, costs))
 
 
 if __name__ == "__main__":
@@ -1,11 +1,12 @@
+import json
 import os
-import psycopg2
-from flask import Flask, render_template
-import randomizer
-import covalent as ct
-import pandas as pds
-import grover_for_minimization
-from sqlalchemy import create_engine
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context
+import route_cache
+import route_config
+
+# qiskit, covalent, pandas, scikit-learn and the database drivers are imported by the routes that use them, so that
+#  /, /health and cached routes are served without loading them. Set PYROUTE_PREWARM to load them and start the
+#  executor's worker processes up front instead.
 
 app = Flask(__name__)
 
@@ -16,6 +17,8 @@ def get_db_connection():
     :return: Connection:
         connection to database
     """
+    import psycopg2
+
     conn = psycopg2.connect(host='db',
                             database='iQuHack',
                             user=os.environ['DB_USERNAME'],
@@ -28,6 +31,8 @@ def get_pandas_db():
      :return: Connection:
         connection to pandas database
         """
+    from sqlalchemy import create_engine
+
     alchemyEngine = create_engine("postgresql+psycopg2://postgres:postgres@db/iQuHack",
                                   pool_recycle=3600)
     conn = alchemyEngine.connect()
@@ -39,9 +44,15 @@ def index():
     return "AmplifiQation"
 
 
+@app.route('/health')
+def health():
+    return "ok"
+
+
 @app.route('/random')
-@ct.electron
 def random():
+    import randomizer
+
     # 0 for local simulator, 1 for IBM sim, 2 for QC
     token = os.environ["IBM_QUANTUM_TOKEN"]
     # Hard coded values for testing
@@ -60,13 +71,137 @@ def random():
 #    print(distance_matrix)
 #    conn.close();
 #    return "pandas"
-    
+
+
+_route_cache = None
+
+
+def get_route_cache():
+    """
+    Returns the route cache, creating it on first use. PYROUTE_CACHE_STORE
+    selects the durable store: 'postgres' for the route_cache table, otherwise
+    JSON files under PYROUTE_CACHE_DIR.
+    :return: RouteCache:
+        the route cache
+    """
+    global _route_cache
+    if _route_cache is None:
+        if os.environ.get('PYROUTE_CACHE_STORE') == 'postgres':
+            store = route_cache.PostgresRouteStore(get_db_connection)
+        else:
+            store = route_cache.FileRouteStore(os.environ.get('PYROUTE_CACHE_DIR', 'output/route_cache'))
+        _route_cache = route_cache.RouteCache(store, ttl=float(os.environ.get('PYROUTE_CACHE_TTL', 24 * 60 * 60)))
+    return _route_cache
+
+
+def parse_route_request():
+    """
+    Reads ?locations=<comma separated ids> and the solver options (see
+    route_config.SOLVER_OPTIONS) from the query string.
+    Raises ValueError for a malformed request.
+    :return: Tuple[List[int], Dict]:
+        The sorted, de-duplicated location ids and the solver options.
+    """
+    try:
+        location_ids = sorted({int(i) for i in request.args.get('locations', '0,1,2,3').split(',')})
+    except ValueError:
+        raise ValueError("locations must be a comma separated list of ids")
+    if len(location_ids) > route_config.MAX_LOCATIONS:
+        raise ValueError(f"at most {route_config.MAX_LOCATIONS} locations are supported, got {len(location_ids)}")
+    options = {name: request.args.get(name, type=option_type)
+               for name, option_type in route_config.SOLVER_OPTIONS.items()}
+    return location_ids, route_config.validate_options(options)
+
+
+def route_cache_key(location_ids, options):
+    """
+    Returns the route cache, checked against the current catalogue, and the
+    key of this instance.
+    Raises FileNotFoundError if the location catalogue is missing.
+    """
+    cache = get_route_cache()
+    try:
+        catalogue = route_cache.catalogue_version(route_config.LOCATIONS_CSV)
+    except OSError:
+        raise FileNotFoundError("location catalogue " + route_config.LOCATIONS_CSV + " is not available")
+    cache.set_catalogue(catalogue)
+    return cache, route_cache.instance_key(location_ids, options, cache.catalogue)
+
+
 @app.route('/PyROUTE')
-@ct.lattice
 def PyROUTE():
-    arr_ = [18, 10, 6, 7]
-    x_ = 3
-    found_number_smaller_than_x = grover_for_minimization.grover_for_minimization(arr=arr_, x=x_)
-    print("Found a number smaller than x: " + str(found_number_smaller_than_x))
+    """
+    Cheapest round trip through ?locations=<comma separated ids>, with optional
+    solver options (see route_config.SOLVER_OPTIONS) as further query arguments.
+    """
+    try:
+        location_ids, options = parse_route_request()
+    except ValueError as e:
+        return str(e), 400
+
+    try:
+        cache, key = route_cache_key(location_ids, options)
+    except FileNotFoundError as e:
+        return str(e), 503
+    route = cache.get(key)
+    if route is None:
+        # Only a cache miss loads the solver (and qiskit, covalent, pandas).
+        import route_solver
+
+        try:
+            route = route_solver.solve_route(location_ids, options)
+        except ValueError as e:
+            return str(e), 400
+        cache.put(key, route)
+
+    print("Route: " + str(route))
+    return jsonify(route)
+
+
+def server_sent_event(event: str, data) -> str:
+    return "event: " + event + "\ndata: " + json.dumps(data) + "\n\n"
+
+
+@app.route('/PyROUTE/stream')
+def PyROUTE_stream():
+    """
+    Same as /PyROUTE, but as Server-Sent Events: a 'route' event for every
+    improved route, then a 'final' event with the answer (or an 'error' event).
+    Disconnecting stops the computation.
+    """
+    try:
+        location_ids, options = parse_route_request()
+    except ValueError as e:
+        return str(e), 400
+
+    try:
+        cache, key = route_cache_key(location_ids, options)
+    except FileNotFoundError as e:
+        return str(e), 503
+
+    def events():
+        route = cache.get(key)
+        if route is not None:
+            yield server_sent_event('final', route)
+            return
+
+        try:
+            import route_solver
+
+            for route in route_solver.iter_route(location_ids, options):
+                if route.pop('final'):
+                    cache.put(key, route)
+                    yield server_sent_event('final', route)
+                else:
+                    yield server_sent_event('route', route)
+        except Exception as e:
+            # The response has started, so report any failure (bad request, backend, credentials) as an event.
+            yield server_sent_event('error', str(e))
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 
-    return "Found a number smaller than x: " + str(found_number_smaller_than_x)
+if os.environ.get('PYROUTE_PREWARM'):
+    import prewarm
+    prewarm.prewarm()
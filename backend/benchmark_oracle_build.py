@@ -0,0 +1,139 @@
+"""
+Author: AmplifiQation
+
+iQuHACK 2023
+
+Benchmark the minimization oracle build time against len(arr).
+
+Compares minimization_oracle(), which records gates with CircuitBuilder, to the
+previous construction that composed a new sub-circuit (on freshly allocated
+registers) for every step and inverted a copy of the loading circuit. The
+oracle contains initialize for x > 1, so it has no unitary to compare;
+check_equivalence() instead compares the unitaries of the value-loading block
+and of the x = 1 oracle (load, then uncompute), which covers the builder's
+reordering, swap removal and rotation merging. It runs before the timings.
+
+Usage:
+    python benchmark_oracle_build.py [max_len]
+"""
+import math
+import sys
+import time
+from typing import List
+
+from numpy import pi
+from qiskit import QuantumCircuit, QuantumRegister
+from qiskit.quantum_info import Operator
+
+from circuit_builder import CircuitBuilder
+from grover_for_minimization import load_values_in_arr, minimization_oracle, to_list
+from qft import qft
+
+
+def _n_ancillary(arr: List[int], x: int) -> int:
+    return max(math.ceil(math.log(sum(arr) + 1, 2)), math.ceil(math.log(x + 1, 2)))
+
+
+def compose_load_values(arr: List[int], x: int) -> QuantumCircuit:
+    """
+    Reference value-loading block built by repeated circuit.compose(), as
+    before CircuitBuilder.
+    :param arr: List[int]
+    :param x: int
+    :return: QuantumCircuit:
+        QFT, controlled additions and inverse QFT (with swaps).
+    """
+    n_data = len(arr)
+    n_ancillary = _n_ancillary(arr, x)
+    circuit = QuantumCircuit(QuantumRegister(n_ancillary, 'ancillary_q'), QuantumRegister(n_data, 'data_q'))
+
+    circuit_for_recovery = circuit.copy()
+    qft(circuit=circuit, n=n_ancillary)
+    for j in range(n_data):
+        k_addition_circuit = QuantumCircuit(QuantumRegister(n_ancillary, 'ancillary_q'),
+                                            QuantumRegister(n_data, 'data_q'))
+        for n in range(n_ancillary):
+            k_addition_circuit.crz(arr[j] * pi / (2 ** j), n_ancillary + j, n)
+        circuit = circuit.compose(k_addition_circuit)
+    return circuit.compose(qft(circuit=circuit_for_recovery, n=n_ancillary).inverse())
+
+
+def compose_minimization_oracle(arr: List[int], x: int) -> QuantumCircuit:
+    """
+    Reference oracle built by repeated circuit.compose(), as before CircuitBuilder.
+    :param arr: List[int]
+    :param x: int
+    :return: QuantumCircuit:
+        A marking oracle.
+    """
+    n_data = len(arr)
+    n_ancillary = _n_ancillary(arr, x)
+    circuit = compose_load_values(arr, x)
+
+    cleanup = circuit.inverse().copy()
+    for i in range(1, x):
+        ancillary_register_q = QuantumRegister(n_ancillary, 'ancillary_q')
+        sign_flip_circuit = QuantumCircuit(ancillary_register_q, QuantumRegister(n_data, 'data_q'))
+        binary_list = to_list(n=i, n_wires=n_ancillary)
+        sign_flip_circuit.initialize(i, qubits=ancillary_register_q)
+        if binary_list[-1] == 0:
+            sign_flip_circuit.x(ancillary_register_q[-1])
+        sign_flip_circuit.h(ancillary_register_q[-1])
+        sign_flip_circuit.mcx(control_qubits=ancillary_register_q[:-1], target_qubit=ancillary_register_q[-1])
+        sign_flip_circuit.h(ancillary_register_q[-1])
+        if binary_list[-1] == 0:
+            sign_flip_circuit.x(ancillary_register_q[-1])
+        circuit = circuit.compose(sign_flip_circuit)
+
+    return circuit.compose(cleanup)
+
+
+def check_equivalence(arr: List[int]) -> bool:
+    """
+    Whether the builder and the compose-based reference give the same unitary
+    (up to global phase) for the value-loading block and for the x = 1 oracle.
+    Keep arr short: the operators have 2**(len(arr) + ancillary qubits) rows.
+    :param arr: List[int]
+    :return: bool:
+    """
+    n_data = len(arr)
+    n_ancillary = _n_ancillary(arr, 1)
+
+    builder = load_values_in_arr(circuit=CircuitBuilder(), n_ancillary_qubits=n_ancillary, n_data_qubits=n_data,
+                                 arr=arr)
+    builder_load = builder.apply(QuantumCircuit(QuantumRegister(n_ancillary, 'ancillary_q'),
+                                                QuantumRegister(n_data, 'data_q')))
+
+    return (Operator(builder_load).equiv(Operator(compose_load_values(arr, 1)))
+            and Operator(minimization_oracle(arr, 1)).equiv(Operator(compose_minimization_oracle(arr, 1))))
+
+
+def time_build(build, arr: List[int], x: int, repeats: int = 3) -> float:
+    """
+    Best-of-repeats wall time, in seconds, of build(arr, x).
+    """
+    best = math.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        build(arr, x)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+
+    max_len = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+
+    for arr_ in ([1], [3, 1], [18, 10, 6, 7], [3, 5, 4, 3]):
+        assert check_equivalence(arr_), f"builder and compose oracles differ for {arr_}"
+    print("builder and compose oracles are equivalent")
+
+    print(f"{'len(arr)':>8} {'compose (s)':>12} {'builder (s)':>12} {'speedup':>8}")
+    n = 4
+    while n <= max_len:
+        arr_ = list(range(n, 0, -1))
+        x_ = n // 2
+        t_compose = time_build(compose_minimization_oracle, arr_, x_)
+        t_builder = time_build(minimization_oracle, arr_, x_)
+        print(f"{n:>8} {t_compose:>12.4f} {t_builder:>12.4f} {t_compose / t_builder:>7.1f}x")
+        n *= 2
@@ -0,0 +1,122 @@
+"""
+Author: AmplifiQation
+
+iQuHACK 2023
+
+Record-then-emit circuit builder used by the minimization oracle.
+
+Composing circuits in a loop (circuit = circuit.compose(sub)) copies the whole
+circuit on every iteration, and circuit.inverse().copy() copies it twice more.
+CircuitBuilder instead appends gates to one flat list on integer wire indices,
+builds uncompute blocks by reversing that list, and writes everything into a
+single QuantumCircuit at the end.
+"""
+from math import isclose, pi
+from typing import Iterable, List, Tuple
+
+from qiskit import QuantumCircuit
+
+# (name, params, qubits)
+Operation = Tuple[str, tuple, tuple]
+
+# Gates that are their own inverse.
+SELF_INVERSE_GATES = {'h', 'x', 'swap', 'mcx'}
+
+# Single-angle rotations and the period of their angle, used for merging and inverting.
+ROTATION_PERIODS = {'cp': 2 * pi, 'crz': 4 * pi}
+
+
+class CircuitBuilder:
+    """
+    Gate recorder with the same gate methods as QuantumCircuit, so it can be
+    passed to functions such as qft.qft() in place of a circuit.
+    ops: List[Operation]
+        The recorded gates, in order.
+    """
+    ops: List[Operation]
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty builder.
+        :return: None:
+        """
+        self.ops = []
+
+    def _append(self, name: str, params: tuple, qubits: tuple) -> None:
+        """
+        Record a gate, merging it into the previous gate if both are the same
+        rotation on the same wires.
+        :return: None:
+        """
+        period = ROTATION_PERIODS.get(name)
+        if period is not None:
+            if self.ops and self.ops[-1][0] == name and self.ops[-1][2] == qubits:
+                params = (self.ops[-1][1][0] + params[0],)
+                self.ops.pop()
+            remainder = params[0] % period
+            if isclose(remainder, 0, abs_tol=1e-12) or isclose(remainder, period, abs_tol=1e-12):
+                return  # The rotation is the identity.
+        self.ops.append((name, params, qubits))
+
+    def h(self, qubit: int) -> None:
+        self._append('h', (), (qubit,))
+
+    def x(self, qubit: int) -> None:
+        self._append('x', (), (qubit,))
+
+    def swap(self, qubit1: int, qubit2: int) -> None:
+        self._append('swap', (), (qubit1, qubit2))
+
+    def cp(self, theta: float, control_qubit: int, target_qubit: int) -> None:
+        self._append('cp', (theta,), (control_qubit, target_qubit))
+
+    def crz(self, theta: float, control_qubit: int, target_qubit: int) -> None:
+        self._append('crz', (theta,), (control_qubit, target_qubit))
+
+    def mcx(self, control_qubits: Iterable[int], target_qubit: int) -> None:
+        self._append('mcx', (), (tuple(control_qubits), target_qubit))
+
+    def initialize(self, params, qubits: Iterable[int]) -> None:
+        self._append('initialize', (params,), tuple(qubits))
+
+    def extend(self, ops: Iterable[Operation]) -> None:
+        """
+        Record a sequence of previously recorded gates, e.g. from inverse().
+        :param ops: Iterable[Operation]
+        :return: None:
+        """
+        for name, params, qubits in ops:
+            self._append(name, params, qubits)
+
+    def inverse(self) -> List[Operation]:
+        """
+        The adjoint of everything recorded so far, as a new list of gates.
+        :return: List[Operation]:
+            Gates in reverse order, with rotation angles negated.
+        """
+        inverse_ops = []
+        for name, params, qubits in reversed(self.ops):
+            if name in ROTATION_PERIODS:
+                inverse_ops.append((name, (-params[0],), qubits))
+            elif name in SELF_INVERSE_GATES:
+                inverse_ops.append((name, params, qubits))
+            else:
+                raise ValueError(f"cannot invert {name}")
+        return inverse_ops
+
+    def apply(self, circuit: QuantumCircuit) -> QuantumCircuit:
+        """
+        Write the recorded gates into circuit. Wire indices refer to
+        circuit.qubits.
+        :param circuit: QuantumCircuit
+        :return: QuantumCircuit:
+            The provided circuit, operation is done in place.
+        """
+        for name, params, qubits in self.ops:
+            if name == 'mcx':
+                circuit.mcx(control_qubits=list(qubits[0]), target_qubit=qubits[1])
+            elif name == 'initialize':
+                circuit.initialize(params[0], qubits=list(qubits))
+            else:
+                getattr(circuit, name)(*params, *qubits)
+        return circuit
@@ -0,0 +1,146 @@
+"""
+Author: AmplifiQation
+
+iQuHACK 2023
+
+Pick the cheapest exact Aer simulation method for a circuit, and configure
+threading and memory for it.
+"""
+import os
+from typing import Optional
+
+from qiskit import QuantumCircuit, transpile
+from qiskit_aer import AerSimulator
+
+# Instructions a stabilizer simulator handles exactly (measure, barrier, etc. included).
+CLIFFORD_INSTRUCTIONS = {'h', 's', 'sdg', 'x', 'y', 'z', 'sx', 'sxdg', 'id', 'cx', 'cy', 'cz', 'swap',
+                         'measure', 'barrier', 'reset'}
+
+# Basis the depth is measured in. Until they are unrolled, mcx and initialize count as depth 1 however many
+#  qubits they act on.
+BASIS_GATES = ['u', 'cx', 'measure', 'barrier', 'reset']
+
+# Aer only parallelises a single statevector above this many qubits; below it, threads are better spent on shots.
+STATEVECTOR_PARALLEL_THRESHOLD = 14
+
+# Past this width a shallow circuit has little entanglement and is cheaper as a matrix product state.
+MPS_MIN_QUBITS = 20
+
+# Bytes per complex128 amplitude.
+AMPLITUDE_BYTES = 16
+
+# Simulators already built, keyed by their options, so each configuration is only set up once per process.
+_simulators = {}
+
+
+def _available_memory_mb() -> int:
+    """
+    Memory cap for the simulator: PYROUTE_MAX_MEMORY_MB if set, otherwise half
+    of physical memory.
+    :return: int:
+        Memory cap in MB.
+    """
+    if 'PYROUTE_MAX_MEMORY_MB' in os.environ:
+        return int(os.environ['PYROUTE_MAX_MEMORY_MB'])
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (2 * 1024 ** 2)
+    except (ValueError, OSError, AttributeError):
+        return 0  # Let Aer decide.
+
+
+def _available_threads() -> int:
+    """
+    Thread budget for the simulator: PYROUTE_SIM_THREADS if set, otherwise the
+    CPU count.
+    :return: int:
+        Number of OpenMP threads.
+    """
+    if 'PYROUTE_SIM_THREADS' in os.environ:
+        return int(os.environ['PYROUTE_SIM_THREADS'])
+    return os.cpu_count() or 1
+
+
+class ExecutionPolicy:
+    """
+    Simulation method and parallelism chosen from a circuit's shape.
+    method: str
+        'stabilizer', 'statevector' or 'matrix_product_state'.
+    num_qubits: int
+    depth: int
+    shots: int
+    max_parallel_threads: int
+        OpenMP threads Aer may use.
+    max_parallel_shots: int
+        Shots run in parallel; 1 when the threads go to the statevector instead.
+    max_memory_mb: int
+        Memory cap passed to Aer; 0 lets Aer decide.
+    """
+    method: str
+    num_qubits: int
+    depth: int
+    shots: int
+    max_parallel_threads: int
+    max_parallel_shots: int
+    max_memory_mb: int
+
+    def __init__(self, circuit: QuantumCircuit, shots: int = 1024, max_memory_mb: Optional[int] = None,
+                 max_parallel_threads: Optional[int] = None) -> None:
+        """
+        Inspects circuit and chooses how to simulate it.
+        :param circuit: QuantumCircuit
+            The circuit to run. Unless it is Clifford, its depth is measured
+            after unrolling it to BASIS_GATES; pass circuits already
+            transpiled to BASIS_GATES to avoid doing that twice.
+        :param shots: int (optional; default is 1024)
+        :param max_memory_mb: int (optional; default is PYROUTE_MAX_MEMORY_MB or half of physical memory)
+        :param max_parallel_threads: int (optional; default is PYROUTE_SIM_THREADS or the CPU count)
+        :return: None:
+        """
+        self.num_qubits = circuit.num_qubits
+        self.shots = shots
+        self.max_memory_mb = _available_memory_mb() if max_memory_mb is None else max_memory_mb
+        self.max_parallel_threads = _available_threads() if max_parallel_threads is None else max_parallel_threads
+
+        gate_set = set(circuit.count_ops())
+        statevector_mb = AMPLITUDE_BYTES * 2 ** self.num_qubits / 1024 ** 2
+        fits_in_memory = self.max_memory_mb == 0 or statevector_mb <= self.max_memory_mb
+
+        if gate_set <= CLIFFORD_INSTRUCTIONS:
+            # Polynomial time and memory, exact for Clifford circuits (e.g. the Hadamard RNG), whatever the depth.
+            self.method = 'stabilizer'
+            self.depth = circuit.depth()
+        else:
+            if not gate_set <= set(BASIS_GATES):
+                circuit = transpile(circuit, basis_gates=BASIS_GATES, optimization_level=0)
+            self.depth = circuit.depth()
+            if fits_in_memory and (self.num_qubits < MPS_MIN_QUBITS or self.depth > 2 * self.num_qubits):
+                self.method = 'statevector'
+            else:
+                self.method = 'matrix_product_state'
+
+        if self.method == 'statevector' and self.num_qubits >= STATEVECTOR_PARALLEL_THRESHOLD:
+            # One large statevector: give every thread to it.
+            self.max_parallel_shots = 1
+        else:
+            # Small states: run the shots side by side instead.
+            self.max_parallel_shots = max(1, min(shots, self.max_parallel_threads))
+
+    def simulator(self) -> AerSimulator:
+        """
+        An AerSimulator configured with this policy. Simulators are shared
+        between policies with the same configuration.
+        :return: AerSimulator:
+        """
+        options = (self.method, self.max_parallel_threads, self.max_parallel_shots, self.max_memory_mb)
+        if options not in _simulators:
+            _simulators[options] = AerSimulator(method=self.method,
+                                                max_parallel_threads=self.max_parallel_threads,
+                                                max_parallel_shots=self.max_parallel_shots,
+                                                max_memory_mb=self.max_memory_mb,
+                                                statevector_parallel_threshold=STATEVECTOR_PARALLEL_THRESHOLD)
+        return _simulators[options]
+
+    def __str__(self) -> str:
+        return (f"ExecutionPolicy(method={self.method}, qubits={self.num_qubits}, depth={self.depth}, "
+                f"shots={self.shots}, threads={self.max_parallel_threads}, "
+                f"parallel_shots={self.max_parallel_shots}, max_memory_mb={self.max_memory_mb})")
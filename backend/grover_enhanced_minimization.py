@@ -7,10 +7,19 @@ Find the minimum value in a list using the Durr & Hoyer Quantum algorithm for mi
 C. Durr and P. Hoyer, “A Quantum Algorithm for Finding the Minimum,” 1996, doi: 10.48550/arxiv.quant-ph/9607014.
 """
 
-from grover_for_minimization import grover_for_minimization
+from concurrent.futures import CancelledError, Future
+from typing import Callable, List, Optional
+
+from grover_for_minimization import grover_for_minimization, grover_for_minimization_batch
+from local_executor import LocalExecutor
+
 
 def grover_enhanced_minimization(arr: list[int], _lower_bound: int = 0, _upper_bound: int = None,
-                                 verbose: bool = False) -> int:
+                                 verbose: bool = False,
+                                 on_improvement: Optional[Callable[[int], Optional[bool]]] = None,
+                                 should_stop: Optional[Callable[[], bool]] = None,
+                                 executor: Optional[LocalExecutor] = None,
+                                 pivots_per_round: int = 1, approximation_degree: int = 0) -> int:
     """
     Use the Durr & Hoyer Quantum algorithm for minimization to find the minimum
     value in arr.
@@ -26,10 +35,34 @@ def grover_enhanced_minimization(arr: list[int], _lower_bound: int = 0, _upper_b
         A list of input values >= 0. We are searching for the minimum.
     :param verbose: bool (optional; default is False):
         Print our extra information - useful for debugging.
+    :param on_improvement: Callable (optional; default is None):
+        Called with the initial upper bound and then with every smaller element
+        found, so callers can report the best value so far. If it returns True
+        the search stops early and returns that value.
+    :param should_stop: Callable (optional; default is None):
+        Checked before every round. If it returns True the search stops and
+        returns the best value so far, e.g. once nobody waits for the answer.
+    :param executor: LocalExecutor (optional; default is None):
+        Run the Grover probes on this executor. While a probe runs, the probe
+        for the next pivot after a miss is started speculatively, so after a
+        miss it is already running (or done) thanks to the executor's cache.
+        After a hit it is cancelled, unless it already started.
+    :param pivots_per_round: int (optional; default is 1):
+        Probe this many pivots per round, spread evenly over the current bounds
+        (3 gives the quartiles) and submitted together in one backend run.
+        Each round then narrows the bounds to about 1/(pivots_per_round + 1),
+        trading extra circuits for fewer sequential round trips:
+        O(log(m) / log(pivots_per_round + 1)) rounds.
+    :param approximation_degree: int (optional; default is 0):
+        Approximation degree of the oracle's QFTs, see qft.qft_rotations().
+        Higher degrees give shallower circuits but noisier sums.
     :return: int:
-        The smallest value in arr.
+        The smallest value in arr (or the best found so far, if stopped early).
     """
 
+    if pivots_per_round < 1:
+        raise ValueError(f"pivots_per_round must be at least 1, got {pivots_per_round}")
+
     if _upper_bound is None:
         # First iteration. For an initial upper bound, just use the first element in arr. Worst case, this is the
         #  biggest element.
@@ -37,54 +70,121 @@ def grover_enhanced_minimization(arr: list[int], _lower_bound: int = 0, _upper_b
         if _lower_bound > _upper_bound:
             raise Exception("Error: The initial_bound must be less than arr[0].")
 
-    if verbose:
-        print("\nLower bound: " + str(_lower_bound))
-        print("Upper bound: " + str(_upper_bound))
+    if on_improvement is not None and on_improvement(_upper_bound):
+        return _upper_bound
 
-    # We keep going till the upper and lower bounds cross.
-    if _upper_bound >= _lower_bound:
-        middle = (_upper_bound + _lower_bound) // 2
+    # The speculative probe still outstanding, if any.
+    speculative = None
 
-        # Using Grover, check if there is an element smaller than the middle value.
-        # smaller_element_exists = grover_for_minimization_classical(arr=arr, x=middle)
-        smaller_element_exists = grover_for_minimization(arr=arr, x=middle)
+    # We keep going till the upper and lower bounds cross.
+    while _upper_bound >= _lower_bound:
+        if should_stop is not None and should_stop():
+            if speculative is not None:
+                speculative.cancel()
+            return _upper_bound
+
+        if verbose:
+            print("\nLower bound: " + str(_lower_bound))
+            print("Upper bound: " + str(_upper_bound))
+
+        if pivots_per_round > 1:
+            # Probe several pivots spread over the bounds in one batched run. Every pivot without a smaller element
+            #  below the first one that has one raises the lower bound; the smallest element found is the new upper
+            #  bound. (A miss above a hit can only be a false negative, so it is ignored.)
+            pivots = k_ary_pivots(_lower_bound, _upper_bound, pivots_per_round)
+            if executor is None:
+                found_elements = grover_for_minimization_batch(arr=arr, xs=pivots,
+                                                               approximation_degree=approximation_degree)
+            else:
+                found_elements = executor.submit(grover_for_minimization_batch, arr, pivots,
+                                                 approximation_degree=approximation_degree).result()
+
+            hits = [i for i, found_element in enumerate(found_elements) if found_element is not None]
+            smaller_element = min(found_elements[i] for i in hits) if hits else None
+            first_hit = hits[0] if hits else len(pivots)
+            new_lower_bound = pivots[first_hit - 1] + 1 if first_hit > 0 else None
 
-        if smaller_element_exists:
-            # There is at least one element smaller than middle, lower our upper bound.
+        else:
+            middle = (_upper_bound + _lower_bound) // 2
+
+            # Using Grover, look for an element smaller than the middle value.
+            # smaller_element = grover_for_minimization_classical(arr=arr, x=middle)
+            if executor is None:
+                smaller_element = grover_for_minimization(arr=arr, x=middle,
+                                                          approximation_degree=approximation_degree)
+            else:
+                probe = executor.submit(grover_for_minimization, arr, middle,
+                                        approximation_degree=approximation_degree)
+                # Speculate on the next pivot after a miss. A hit lowers the upper bound to the element found,
+                #  which we cannot guess, so there is no pivot worth starting for that case.
+                speculative = None
+                if middle + 1 <= _upper_bound:
+                    speculative = executor.submit(grover_for_minimization, arr, (middle + 1 + _upper_bound) // 2,
+                                                  approximation_degree=approximation_degree)
+                smaller_element = _probe_result(executor, probe, arr, middle, approximation_degree)
+                if smaller_element is not None and speculative is not None:
+                    # Not needed after all, drop it unless it already started.
+                    speculative.cancel()
+                    speculative = None
+
+            new_lower_bound = middle + 1 if smaller_element is None else None
+
+        if smaller_element is not None:
+            # We found (and verified) an element smaller than a pivot, it is our new upper bound.
             if verbose:
-                print("Smaller element found, lowering our upper bound...")
-            return grover_enhanced_minimization(arr, _lower_bound=_lower_bound,
-                                                _upper_bound=middle - 1,
-                                                verbose=verbose)
+                print("Smaller element " + str(smaller_element) + " found, lowering our upper bound...")
+            _upper_bound = smaller_element
+            if on_improvement is not None and on_improvement(_upper_bound):
+                return _upper_bound
 
-        else:
-            # There are no elements smaller than middle, raise the lower bound.
+        if new_lower_bound is not None:
+            # There are no elements smaller than a pivot, raise the lower bound.
             if verbose:
                 print("No smaller element found, raising our lower bound...")
-            return grover_enhanced_minimization(arr, _lower_bound=middle + 1,
-                                                _upper_bound=_upper_bound,
-                                                verbose=verbose)
+            _lower_bound = max(_lower_bound, new_lower_bound)
 
-    else:
-        # Bounds have crossed, return the solution.
-        return _upper_bound
+    # Bounds have crossed, return the solution.
+    return _upper_bound
+
+
+def _probe_result(executor: LocalExecutor, probe: Future, arr: List[int], x: int,
+                  approximation_degree: int) -> Optional[int]:
+    """
+    Wait for a probe. A probe shared with a speculative one that another
+    search cancelled is started again.
+    """
+    try:
+        return probe.result()
+    except CancelledError:
+        return executor.submit(grover_for_minimization, arr, x, approximation_degree=approximation_degree).result()
+
+
+def k_ary_pivots(lower_bound: int, upper_bound: int, k: int) -> List[int]:
+    """
+    Up to k distinct pivots splitting [lower_bound, upper_bound] into k + 1
+    roughly equal parts.
+    :return: List[int]:
+        The pivots, in ascending order.
+    """
+    span = upper_bound - lower_bound + 1
+    return sorted({lower_bound + span * i // (k + 1) for i in range(1, k + 1)})
 
 
-def grover_for_minimization_classical(arr: list[int], x: int) -> bool:
+def grover_for_minimization_classical(arr: list[int], x: int) -> Optional[int]:
     """
     This is a classical function that performs the same function as
-    grover_for_minimization(). That is, check if arr contains an element < x.
+    grover_for_minimization(). That is, find an element of arr < x.
     This is just used for testing to make sure the classical
     grover_enhanced_minimization() overhead is working as expected.
-    :return: bool:
-        True: We found an element in arr < x.
-        False: otherwise.
+    :return: Optional[int]:
+        An element in arr < x.
+        None: otherwise.
     """
     for i in range(len(arr)):
         if arr[i] < x:
-            return True  # We have found a smaller value!
+            return arr[i]  # We have found a smaller value!
 
-    return False  # No element in list > middle
+    return None  # No element in list < x
 
 
 if __name__ == "__main__":
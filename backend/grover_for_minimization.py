@@ -11,27 +11,25 @@ Proceedings of the twenty-eighth annual ACM symposium on theory of computing,
 """
 
 import math
+import os
 
+import numpy as np
 import qiskit
 from qiskit import ClassicalRegister, QuantumCircuit, QuantumRegister, transpile
 from qiskit.circuit.library import GroverOperator
-from qiskit import Aer
-from qiskit.visualization import plot_histogram
 import covalent as ct
 
 #import matplotlib.pyplot as plt
 
 from numpy import pi as pi
-from typing import List
+from typing import Dict, List, Optional, Union
 
-from qiskit_aer import AerSimulator
+from circuit_builder import CircuitBuilder
+from execution_policy import BASIS_GATES, ExecutionPolicy
+from qft import inverse_qft, qft
 
-from qft import qft
 
-from qiskit import IBMQ
-
-
-def minimization_oracle(arr: List[int], x: int) -> QuantumCircuit:
+def minimization_oracle(arr: List[int], x: int, approximation_degree: int = 0) -> QuantumCircuit:
     """
     Marking oracle that flips the sign of elements that satisfy the minimization
     condition.
@@ -41,6 +39,8 @@ def minimization_oracle(arr: List[int], x: int) -> QuantumCircuit:
         The list we are searching.
     :param x: int
         Our current pivot element.
+    :param approximation_degree: int (optional; default is 0)
+        Approximation degree of the QFTs used for the addition, see qft.qft_rotations().
     :return: QuantumCircuit:
         A marking oracle.
     """
@@ -54,86 +54,79 @@ def minimization_oracle(arr: List[int], x: int) -> QuantumCircuit:
     ancillary_register_q = QuantumRegister(number_ancillary_qubits_required, 'ancillary_q')
     # Ancillary bits are just work bits, we won't need to measure them.
 
-    oracle_circuit = QuantumCircuit(ancillary_register_q, data_register_q)
+    # Record the oracle on wire indices (ancillary wires first, then data wires) and emit it into one circuit at
+    #  the end, rather than composing a fresh sub-circuit for every step.
+    builder = CircuitBuilder()
 
     # Conditionally load all the values in arr onto the axcillary register.
-    oracle_circuit = load_values_in_arr(circuit=oracle_circuit,
-                                        n_ancillary_qubits=number_ancillary_qubits_required,
-                                        n_data_qubits=number_of_data_qubits_required, arr=arr)
+    load_values_in_arr(circuit=builder,
+                       n_ancillary_qubits=number_ancillary_qubits_required,
+                       n_data_qubits=number_of_data_qubits_required, arr=arr,
+                       approximation_degree=approximation_degree)
+
+    oracle_cleanup_ops = builder.inverse()
 
-    oracle_circuit_for_cleanup = oracle_circuit.inverse().copy()
+    ancillary_wires = list(range(number_ancillary_qubits_required))
 
     # Loop thorugh all integers in the range 1 to x-1. Notice we start at 1 because the all 0's state would always be
     #  marked. Anyway, in the TSP context arr should never contain any 0's. If we get a sum of elements on the
     #  ancillary wires that is < x, then there must be at least one element in arr that is less than x.
     for i in range(1, x):
 
-        data_register_q_for_flip = QuantumRegister(number_of_data_qubits_required,
-                                                   'data_q')
-        ancillary_register_q_for_flip = QuantumRegister(number_ancillary_qubits_required,
-                                                        'ancillary_q')
-
-        sign_flip_circuit = QuantumCircuit(ancillary_register_q_for_flip,
-                                           data_register_q_for_flip)
-
         binary_list = to_list(n=i, n_wires=number_ancillary_qubits_required)
 
-        sign_flip_circuit.initialize(i, qubits=ancillary_register_q_for_flip)
+        builder.initialize(i, qubits=ancillary_wires)
 
         if binary_list[-1] == 0:
-            sign_flip_circuit.x(ancillary_register_q_for_flip[-1])
+            builder.x(ancillary_wires[-1])
 
         # Since we don't have a controlled Z-gate, use the identity HXH = Z.
-        sign_flip_circuit.h(ancillary_register_q_for_flip[-1])
-        sign_flip_circuit.mcx(control_qubits=ancillary_register_q_for_flip[:-1],
-                              target_qubit=ancillary_register_q_for_flip[-1])
-        sign_flip_circuit.h(ancillary_register_q_for_flip[-1])
+        builder.h(ancillary_wires[-1])
+        builder.mcx(control_qubits=ancillary_wires[:-1],
+                    target_qubit=ancillary_wires[-1])
+        builder.h(ancillary_wires[-1])
 
         if binary_list[-1] == 0:
-            sign_flip_circuit.x(ancillary_register_q_for_flip[-1])
+            builder.x(ancillary_wires[-1])
 
-        oracle_circuit = oracle_circuit.compose(sign_flip_circuit)
+    builder.extend(oracle_cleanup_ops)  # Cleanup.
 
-    oracle_circuit = oracle_circuit.compose(oracle_circuit_for_cleanup)  # Cleanup.
-    return oracle_circuit
+    oracle_circuit = QuantumCircuit(ancillary_register_q, data_register_q)
+    return builder.apply(oracle_circuit)
 
 
-def load_values_in_arr(circuit: QuantumCircuit, n_ancillary_qubits: int,
-                       n_data_qubits: int, arr: List[int]):
+def load_values_in_arr(circuit: Union[QuantumCircuit, CircuitBuilder], n_ancillary_qubits: int,
+                       n_data_qubits: int, arr: List[int], approximation_degree: int = 0):
     """
     Conditionally load all the values in arr onto the axcillary register.
 
-    :param circuit: QuantumCircuit
+    :param circuit: QuantumCircuit or CircuitBuilder
+        Gates are appended in place; wire i < n_ancillary_qubits is ancillary
+        wire i, wire n_ancillary_qubits + j is data wire j.
     :param n_ancillary_qubits: int
         The number of ancillary qubits.
     :param n_data_qubits: int
         The number of data qubits wires.
     :param arr: List[int]
         The list we are searching.
-    :return: QuantumCircuit:
+    :param approximation_degree: int (optional; default is 0)
+        Approximation degree of the QFTs, see qft.qft_rotations().
+    :return: QuantumCircuit or CircuitBuilder:
         The provided circuit, except with added gates to conditionally load all
         the values in arr onto the ancillary register
     """
-    circuit_for_recovery = circuit.copy()
-
     # Perform a QFT, so we can add values in the Fourier basis.
-    qft(circuit=circuit, n=n_ancillary_qubits)
+    #  Every ancillary wire gets the same rotation below, so the addition is symmetric under reordering the
+    #  ancillary wires and the QFT swaps (and their undoing) can be left out.
+    qft(circuit=circuit, n=n_ancillary_qubits, approximation_degree=approximation_degree, do_swaps=False)
 
     # Loop through each of the data wires, preforming controlled additions.
     for j in range(n_data_qubits):
-        data_reg_q = QuantumRegister(n_data_qubits, 'data_q')
-        ancillary_reg_q = QuantumRegister(n_ancillary_qubits, 'ancillary_q')
-
-        k_addition_circuit = QuantumCircuit(ancillary_reg_q, data_reg_q)
         for n in range(n_ancillary_qubits):
-            k_addition_circuit.crz(arr[j] * pi / (2 ** j), n_ancillary_qubits + j, n)
-
-        circuit = circuit.compose(k_addition_circuit)
+            circuit.crz(arr[j] * pi / (2 ** j), n_ancillary_qubits + j, n)
 
     # Return to the computational basis.
-    adjoint_circuit = qft(circuit=circuit_for_recovery,
-                          n=n_ancillary_qubits).inverse()
-    circuit = circuit.compose(adjoint_circuit)
+    inverse_qft(circuit=circuit, n=n_ancillary_qubits, approximation_degree=approximation_degree, do_swaps=False)
 
     return circuit
 
@@ -159,13 +152,15 @@ def to_list(n, n_wires):
     return bin_list
 
 
-def minimization_circuit(arr: List[int], x: int) -> QuantumCircuit:
+def minimization_circuit(arr: List[int], x: int, approximation_degree: int = 0) -> QuantumCircuit:
     """
     Build the complete quantum minimization circuit to find if there exists an
     element in arr < x.
 
     :param arr: List[int]
     :param x: int
+    :param approximation_degree: int (optional; default is 0)
+        Approximation degree of the oracle's QFTs, see qft.qft_rotations().
     :return: QuantumCircuit
     """
     # We need one wire in the data register for each element of arr.
@@ -200,14 +195,13 @@ def minimization_circuit(arr: List[int], x: int) -> QuantumCircuit:
     # Alternatively, we could assume a minimum number of marked elements and work our way up.
     j = 2
 
-    for _ in range(j):
-        # Step 2: Get an oracle we can use to build quantum states.
-        oracle = minimization_oracle(arr=arr, x=x)
+    # Step 2: Get an oracle we can use to build quantum states. It is the same for every iteration.
+    oracle = minimization_oracle(arr=arr, x=x, approximation_degree=approximation_degree)
+    grover_op = GroverOperator(oracle=oracle, insert_barriers=True)
 
+    for _ in range(j):
         # Step 3: Apply the Grover operator to amplify the probability of getting the correct solution.
-        grover_op = GroverOperator(oracle=oracle, insert_barriers=True)
-
-        circuit = circuit.compose(grover_op)
+        circuit.compose(grover_op, inplace=True)
 
     # Draw the minimization oracle
     #oracle.draw(output='mpl')
@@ -217,88 +211,158 @@ def minimization_circuit(arr: List[int], x: int) -> QuantumCircuit:
     circuit.measure(quantum_data_register, classical_data_register)
     return circuit
 
-@ct.lattice
-def grover_for_minimization(arr: List[int], x: int) -> bool:
+
+def verify_candidates(counts: Dict[str, int], arr: List[int], x: int) -> Optional[int]:
     """
-    Use Grover's search to check if arr contains an element < x.
-    Important Precondition:
-        arr must contain integer values > 0.
+    Classically verify every element measured in any shot.
+    Data wire i is measured as 1 when arr[i] is a candidate.
+
+    :param counts: Dict[str, int]
+        Measurement counts keyed by bitstrings of the data register.
     :param arr: List[int]
-        List of integers that the algorithm searches
-    :param x:
-        Element that the algorithm checks against
-    :return: bool:
-        True: We found an element in arr < x.
-        False: otherwise.
+        The list we are searching.
+    :param x: int
+        Element that the algorithm checks against.
+    :return: Optional[int]:
+        The smallest candidate value < x, or None if no candidate is < x.
     """
-    local_sim = False
-    backend = 1
+    bitstrings = [bitstring.replace(' ', '') for bitstring in counts]
+    if not bitstrings:
+        return None
 
-    circuit = minimization_circuit(arr=arr, x=x)
+    # One row per distinct outcome. Qiskit bitstrings are little-endian, so reverse the columns to index by wire.
+    bits = np.frombuffer(''.join(bitstrings).encode(), dtype=np.uint8).reshape(len(bitstrings), -1)[:, ::-1]
+    candidates = (bits == ord('1')).any(axis=0)
 
-    if local_sim:
-        # Execute the circuit on the qasm simulator.
-        backend = AerSimulator()
-        qc_compiled = transpile(circuit, backend)
+    values = np.asarray(arr)
+    verified = values[candidates & (values < x)]
+    if verified.size == 0:
+        return None
+    return int(verified.min())
+
+
+def run_minimization_circuits(arr: List[int], xs: List[int], shots: int, shots_per_batch: int,
+                              approximation_degree: int = 0, backend: Optional[int] = None) -> List[Optional[int]]:
+    """
+    Build the minimization circuit for every pivot in xs and run them
+    together, one backend run per batch of shots, until each pivot has a
+    verified element or the shots run out.
 
-        job_sim = backend.run(qc_compiled, shots=1024)
+    :param arr: List[int]
+    :param xs: List[int]
+        The pivots.
+    :param shots: int
+        Maximum number of shots per pivot.
+    :param shots_per_batch: int
+        Shots per backend run.
+    :param approximation_degree: int (optional; default is 0)
+        Approximation degree of the oracle's QFTs, see qft.qft_rotations().
+    :param backend: int (optional; default is PYROUTE_BACKEND, or 2)
+        0 for IBM QC, 1 for IBM Sim, 2 for Aer Local Sim (as in randomizer.RNG).
+    :return: List[Optional[int]]:
+        For each pivot, the smallest verified element of arr < x that was
+        measured, or None.
+    """
+    if shots < 1 or shots_per_batch < 1:
+        raise ValueError(f"shots and shots_per_batch must be at least 1, got {shots} and {shots_per_batch}")
 
-        # Grab the results from the job.
-        result_sim = job_sim.result()
-        counts = result_sim.get_counts(qc_compiled)
+    if backend is None:
+        backend = int(os.environ.get('PYROUTE_BACKEND', 2))
+    local_sim = backend not in (0, 1)
+
+    circuits = [minimization_circuit(arr=arr, x=x, approximation_degree=approximation_degree) for x in xs]
+
+    if local_sim:
+        # Unroll once, so the policy sees the real depth, then execute the circuits on the simulation method that
+        #  suits the widest of them.
+        compiled = transpile(circuits, basis_gates=BASIS_GATES)
+        policy = ExecutionPolicy(max(compiled, key=lambda circuit: circuit.num_qubits), shots=shots_per_batch)
+        print(policy)
+        backend = policy.simulator()
 
     else:
+        # Only the IBMQ path pays for importing the provider.
+        from qiskit import IBMQ
+
+        token = os.environ["IBM_QUANTUM_TOKEN"]
         IBMQ.save_account(token)
         IBMQ.load_account()
 
         provider = IBMQ.get_provider(hub='ibm-q')
         if backend == 0:
-            IBM_backend = provider.get_backend('ibm_nairobi')
+            backend = provider.get_backend('ibm_nairobi')
         elif backend == 1:
-            IBM_backend = provider.get_backend('simulator_stabilizer')
-
-        job = qt.execute(circuit, IBM_backend, shots=1)
-        counts = job.result().get_counts()
-
-    print(counts)
-
-    # # Draw the circuit
-    # circuit.draw(output='mpl')
-    # plt.show()
-
-    # print("\nlen(values):")  # Four bits can encode 16 distinct characters
-    # print(len(values))
-    # print("\nvalues:")
-    # print(values)
-    # plt.rcParams["figure.figsize"] = [7.50, 6]
-    # plt.rcParams["figure.autolayout"] = True
-    # plt.bar(range(len(values)), values)
-    # plt.xlabel("State", fontsize=25)
-    # plt.ylabel("Probability", fontsize=25)
-    # plt.xticks(fontsize=20)
-    # plt.yticks(fontsize=20)
-    #
-    # plt.show()
-    #
-    # # The second device is for actully obtaining a sample.
-    # device2 = qml.device("default.qubit", wires=data_register + ancillary_register, shots=1)
-    # qnode2 = qml.qnode(func=minimization_circuit, device=device2)(
-    #     data_register=data_register, ancillary_register=ancillary_register, arr=arr, x=x, ret="sample")
-    #
-    # sample = qnode2.__call__(data_register=data_register, ancillary_register=ancillary_register, arr=arr, x=x,
-    #                          ret="sample")
-    # print(sample)
-    #
-    # found_elements = [i for indx, i in enumerate(arr) if sample[indx] == 1]
-    # print("Found elements: " + str(found_elements))
-    #
-    if len(found_elements) > 0:
-        if found_elements[0] < x:
-            # If the found value is actually less than result, great!
-            return True
-
-    # No such element exists.
-    return False
+            # The stabilizer simulator cannot run the oracle's rotations and initialize, so use the general one.
+            backend = provider.get_backend('ibmq_qasm_simulator')
+
+        compiled = transpile(circuits, backend)
+
+    found_elements = [None] * len(xs)
+    pending = list(range(len(xs)))
+    shots_done = 0
+    while pending and shots_done < shots:
+        batch = min(shots_per_batch, shots - shots_done)
+        result = backend.run([compiled[i] for i in pending], shots=batch).result()
+        shots_done += batch
+
+        still_pending = []
+        for experiment, i in enumerate(pending):
+            counts = result.get_counts(experiment)
+            found_elements[i] = verify_candidates(counts=counts, arr=arr, x=xs[i])
+            if found_elements[i] is None:
+                still_pending.append(i)
+        pending = still_pending
+
+    return found_elements
+
+
+@ct.lattice
+def grover_for_minimization(arr: List[int], x: int, shots: int = 1024,
+                            shots_per_batch: int = 128, approximation_degree: int = 0) -> Optional[int]:
+    """
+    Use Grover's search to find an element of arr < x.
+    Important Precondition:
+        arr must contain integer values > 0.
+    :param arr: List[int]
+        List of integers that the algorithm searches
+    :param x:
+        Element that the algorithm checks against
+    :param shots: int (optional; default is 1024)
+        Maximum number of shots.
+    :param shots_per_batch: int (optional; default is 128)
+        Shots per backend run. We stop after the first batch that yields a
+        verified element.
+    :param approximation_degree: int (optional; default is 0)
+        Approximation degree of the oracle's QFTs, see qft.qft_rotations().
+    :return: Optional[int]:
+        The smallest verified element of arr < x that was measured.
+        None: otherwise.
+    """
+    return run_minimization_circuits(arr=arr, xs=[x], shots=shots, shots_per_batch=shots_per_batch,
+                                     approximation_degree=approximation_degree)[0]
+
+
+@ct.lattice
+def grover_for_minimization_batch(arr: List[int], xs: List[int], shots: int = 1024,
+                                  shots_per_batch: int = 128, approximation_degree: int = 0) -> List[Optional[int]]:
+    """
+    grover_for_minimization() for several pivots at once, submitted together
+    in each backend run so they share one round trip (and queue wait).
+    :param arr: List[int]
+        List of integers that the algorithm searches
+    :param xs: List[int]
+        Elements that the algorithm checks against
+    :param shots: int (optional; default is 1024)
+        Maximum number of shots per pivot.
+    :param shots_per_batch: int (optional; default is 128)
+        Shots per backend run.
+    :param approximation_degree: int (optional; default is 0)
+        Approximation degree of the oracle's QFTs, see qft.qft_rotations().
+    :return: List[Optional[int]]:
+        For each pivot, as grover_for_minimization().
+    """
+    return run_minimization_circuits(arr=arr, xs=xs, shots=shots, shots_per_batch=shots_per_batch,
+                                     approximation_degree=approximation_degree)
 
 
 if __name__ == "__main__":
@@ -308,6 +372,6 @@ if __name__ == "__main__":
     arr_ = [36, 5, 8, 14, 15, 2, 4, 16]
     x_ = 3
 
-    found_number_smaller_than_x = grover_for_minimization(arr=arr_, x=x_)
+    number_smaller_than_x = grover_for_minimization(arr=arr_, x=x_)
 
-    print("Found a number smaller than x: " + str(found_number_smaller_than_x))
+    print("Found a number smaller than x: " + str(number_smaller_than_x))
@@ -2,39 +2,101 @@
 https://www.geeksforgeeks.org/print-all-hamiltonian-cycles-in-an-undirected-graph/
 
 # This code is contributed by divyesh072019.
+
+The search runs over adjacency lists, so a sparse graph (for example one built
+with k_nearest_adjacency() or threshold_adjacency()) prunes the (n-1)! orderings
+of a complete graph down to tours along real edges only.
 """
+from typing import List, Optional, Sequence
 
 
-def is_safe(v, graph, path, pos):
+def dense_adjacency(graph) -> List[List[int]]:
     """
-    Function to check if a vertex v can be added at index pos in the
-    Hamiltonian Cycle
+    Adjacency lists of a graph given as a matrix, treating any non-zero entry
+    as an edge.
+    :param graph: 2D array-like
+        Adjacency or cost matrix.
+    :return: List[List[int]]:
+        adjacency[v] is the ascending list of neighbours of v.
     """
-    # If the vertex is adjacent to the vertex of the previously added vertex
-    if graph[path[pos - 1]][v] == 0:
-        return False
+    n = len(graph)
+    return [[u for u in range(n) if u != v and graph[v][u] != 0] for v in range(n)]
 
-    # If the vertex has already been included in the path
-    for i in range(pos):
-        if path[i] == v:
-            return False
 
-    # Both the above conditions are not true, return true
-    return True
+def k_nearest_adjacency(cost_matrix, k: int) -> List[List[int]]:
+    """
+    Sparse adjacency lists keeping, for every vertex, the edges to its k
+    cheapest neighbours. The result is symmetrised (an edge is kept if either
+    end point selected it) so the graph stays undirected.
+    :param cost_matrix: 2D array-like
+        Pairwise costs, e.g. the haversine distance matrix.
+    :param k: int
+        Number of nearest neighbours to keep per vertex.
+    :return: List[List[int]]:
+        adjacency[v] is the ascending list of neighbours of v.
+    """
+    if k < 1:
+        raise ValueError(f"k must be at least 1, got {k}")
 
+    n = len(cost_matrix)
+    neighbours = [set() for _ in range(n)]
+    for v in range(n):
+        others = sorted((u for u in range(n) if u != v), key=lambda u: cost_matrix[v][u])
+        for u in others[:k]:
+            neighbours[v].add(u)
+            neighbours[u].add(v)
 
-# To check if there exists at least 1 hamiltonian cycle
-hasCycle = False
+    return [sorted(adj) for adj in neighbours]
 
 
-def hamiltonian_cycle(graph):
+def threshold_adjacency(cost_matrix, max_cost: float) -> List[List[int]]:
     """
-    Function to find all possible hamiltonian cycles.
+    Sparse adjacency lists keeping only the edges whose cost is at most
+    max_cost.
+    :param cost_matrix: 2D array-like
+        Pairwise costs, e.g. the haversine distance matrix.
+    :param max_cost: float
+        Largest edge cost to keep.
+    :return: List[List[int]]:
+        adjacency[v] is the ascending list of neighbours of v.
+    """
+    n = len(cost_matrix)
+    return [[u for u in range(n) if u != v and cost_matrix[v][u] <= max_cost]
+            for v in range(n)]
+
+
+def adjacency_bitsets(adjacency: Sequence[Sequence[int]]) -> List[int]:
+    """
+    Pack adjacency lists into one integer bitset per vertex, so an edge test is
+    a single mask operation.
+    :param adjacency: Sequence[Sequence[int]]
+        adjacency[v] lists the neighbours of v.
+    :return: List[int]:
+        Bit u of the v-th entry is set iff u is a neighbour of v.
     """
-    global hasCycle
+    bitsets = []
+    for adj in adjacency:
+        mask = 0
+        for u in adj:
+            mask |= 1 << u
+        bitsets.append(mask)
+    return bitsets
 
-    # Initially value of boolean flag is false
-    hasCycle = False
+
+def hamiltonian_cycle(graph, adjacency: Optional[Sequence[Sequence[int]]] = None) -> List[str]:
+    """
+    Function to find all possible hamiltonian cycles.
+    :param graph: 2D array-like
+        Adjacency or cost matrix; any non-zero entry is an edge.
+    :param adjacency: Sequence[Sequence[int]] (optional; default is None)
+        Precomputed (possibly sparse) adjacency lists. When given, only these
+        edges are searched and graph is only used for its size.
+    :return: List[str]:
+        The cycles, as space separated vertices starting and ending at 0.
+    """
+    if adjacency is None:
+        adjacency = dense_adjacency(graph)
+    bitsets = adjacency_bitsets(adjacency)
 
     # Store the resultant path
     path = [0]
@@ -42,62 +104,41 @@ def hamiltonian_cycle(graph):
     # Keeps the track of the visited vertices
     visited = [False] * (len(graph))
 
-    for i in range(len(visited)):
-        visited[i] = False
-
     visited[0] = True
 
-    # Prepare a file in which we will save Hamiltonian path data.
-    import pathlib
-    out_dir = str(pathlib.Path().resolve().parent.resolve()) + "\\data"
-    out_file = out_dir + "\\hamiltonian_cycles_temp.txt"
-    open(out_file, 'w+').close()
-    f = open(out_file, 'a+')
-
     # Function call to find all hamiltonian cycles
-    find_hamiltonian_cycles(graph, 1, path, visited, out_file, f)
-    f.close()
+    cycles = []
+    find_hamiltonian_cycles(adjacency, bitsets, 1, path, visited, cycles)
 
-    if hasCycle:
+    if not cycles:
         # If no Hamiltonian Cycle is possible for the given graph
-        print("No Hamiltonian Cycle" + "possible ")
-        return
+        print("No Hamiltonian Cycle possible")
+    return cycles
 
 
-def find_hamiltonian_cycles(graph, pos, path, visited, out_file, f):
+def find_hamiltonian_cycles(adjacency, bitsets, pos, path, visited, cycles):
     """
-    Recursive function to find all hamiltonian cycles.
+    Recursive function to find all hamiltonian cycles, appending each one to
+    cycles.
     """
-
     # If all vertices are included in Hamiltonian Cycle.
-    if pos == len(graph):
-
-        # If there is an edge from the last vertex to the source vertex.
-        if graph[path[-1]][path[0]] != 0:
-
-            # Include source vertex into the path and print the path.
-            path.append(0)
-            for i in range(len(path)):
-                print(path[i], end=" ", file=f)
-            print(file=f)
-
-            # Remove the source vertex added.
-            path.pop()
+    if pos == len(adjacency):
 
-            # Update the hasCycle as true
-            hasCycle = True
+        # If there is an edge from the last vertex to the source vertex, record the path back to the source.
+        if bitsets[path[-1]] >> path[0] & 1:
+            cycles.append(" ".join(str(v) for v in path) + " " + str(path[0]))
         return None
 
-    # Try different vertices as the next vertex
-    for v in range(len(graph)):
+    # Try the neighbours of the last vertex as the next vertex
+    for v in adjacency[path[-1]]:
 
-        # Check if this vertex can be added to Cycle
-        if is_safe(v, graph, path, pos) and not visited[v]:
+        # Check if this vertex is already in the Cycle
+        if not visited[v]:
             path.append(v)
             visited[v] = True
 
             # Recur to construct rest of the path
-            find_hamiltonian_cycles(graph, pos + 1, path, visited, out_file, f)
+            find_hamiltonian_cycles(adjacency, bitsets, pos + 1, path, visited, cycles)
 
             # Remove current vertex from path and process other vertices
             visited[v] = False
@@ -113,4 +154,5 @@ if __name__ == "__main__":
         [0, 1, 0, 1, 0, 1],
         [1, 1, 0, 0, 1, 0],
     ]
-    hamiltonian_cycle(graph)
+    for cycle in hamiltonian_cycle(graph):
+        print(cycle)
@@ -0,0 +1,265 @@
+"""
+Author: AmplifiQation
+
+iQuHACK 2023
+
+Run our covalent electrons and lattices as a DAG on a local process pool,
+without a covalent dispatcher server.
+
+submit() returns a Future straight away. Futures can be passed as arguments to
+later submit() calls; a task starts as soon as the futures it depends on are
+done, so independent tasks run side by side. Tasks with identical functions and
+arguments share one result.
+"""
+import hashlib
+import importlib
+import multiprocessing
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Modules every worker imports when it starts, so the first probe does not pay for importing qiskit.
+WORKER_MODULES = ('grover_for_minimization', 'execution_policy')
+
+
+def _unwrap(fn: Callable) -> Callable:
+    """
+    The plain Python function behind a covalent lattice or electron.
+    """
+    workflow_function = getattr(fn, 'workflow_function', None)
+    if workflow_function is not None:
+        # Lattices keep their function as a TransportableObject.
+        if hasattr(workflow_function, 'get_deserialized'):
+            return workflow_function.get_deserialized()
+        return workflow_function
+    return getattr(fn, 'function', None) or fn
+
+
+def _run(module_name: str, qualname: str, args: tuple, kwargs: dict) -> Any:
+    """
+    Worker entry point. The decorated functions cannot be pickled by reference
+    (their module attribute is the covalent wrapper), so the worker looks the
+    function up by name and unwraps it itself.
+    """
+    fn = importlib.import_module(module_name)
+    for name in qualname.split('.'):
+        fn = getattr(fn, name)
+    return _unwrap(fn)(*args, **kwargs)
+
+
+def _preload(modules: Tuple[str, ...]) -> None:
+    """
+    Worker initializer: import modules up front. A module that fails to
+    import is skipped, so the task that needs it reports the error instead of
+    the whole pool breaking.
+    """
+    for module_name in modules:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass
+
+
+def _resolve(value: Any) -> Any:
+    """
+    Replace futures (also inside lists, tuples and dicts) by their results.
+    """
+    if isinstance(value, Future):
+        return value.result()
+    if isinstance(value, (list, tuple)):
+        return type(value)(_resolve(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _resolve(item) for key, item in value.items()}
+    return value
+
+
+def _dependencies(value: Any) -> List[Future]:
+    """
+    The futures value depends on.
+    """
+    if isinstance(value, Future):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [future for item in value for future in _dependencies(item)]
+    if isinstance(value, dict):
+        return [future for item in value.values() for future in _dependencies(item)]
+    return []
+
+
+class LocalExecutor:
+    """
+    Process-pool executor for electrons and lattices.
+    max_workers: int
+        Number of worker processes.
+    cache: bool
+        Share results between tasks with identical functions and arguments.
+    max_cached: int
+        Number of results kept for sharing, least recently used are dropped.
+    preload: Tuple[str, ...]
+        Modules each worker imports when it starts.
+    """
+    max_workers: int
+    cache: bool
+    max_cached: int
+    preload: Tuple[str, ...]
+
+    def __init__(self, max_workers: Optional[int] = None, cache: bool = True, max_cached: int = 1024,
+                 preload: Iterable[str] = ()) -> None:
+        """
+        Initializes the executor. Worker processes are started on first use,
+        or by start().
+        :param max_workers: int (optional; default is PYROUTE_WORKERS or the CPU count)
+        :param cache: bool (optional; default is True)
+        :param max_cached: int (optional; default is 1024)
+        :param preload: Iterable[str] (optional; default is no modules)
+        :return: None:
+        """
+        self.max_workers = max_workers or int(os.environ.get('PYROUTE_WORKERS', os.cpu_count() or 1))
+        self.cache = cache
+        self.max_cached = max_cached
+        self.preload = tuple(preload)
+        self._pool = None
+        self._pool_pid = None
+        self._results: Dict[str, Future] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Schedule fn(*args, **kwargs). fn must be a module-level function,
+        electron or lattice (or a method looked up on its class, with the
+        instance passed as the first argument).
+        :param fn: Callable
+        :return: Future:
+            The task's result.
+        """
+        return self._submit(fn, args, kwargs, self.cache)
+
+    def submit_uncached(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Like submit(), but never shares the result, for tasks that should give
+        a different answer every time (e.g. random numbers).
+        :param fn: Callable
+        :return: Future:
+            The task's result.
+        """
+        return self._submit(fn, args, kwargs, False)
+
+    def _submit(self, fn: Callable, args: tuple, kwargs: dict, cache: bool) -> Future:
+        dependencies = _dependencies((args, kwargs))
+        if not dependencies:
+            return self._start(fn, args, kwargs, cache)
+
+        # Start once every dependency is done, without blocking a thread on the wait.
+        future = Future()
+        remaining = [len(dependencies)]
+        lock = threading.Lock()
+
+        def on_dependency_done(_: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                task = self._start(fn, _resolve(args), _resolve(kwargs), cache)
+            except BaseException as e:  # A dependency failed.
+                future.set_exception(e)
+                return
+            task.add_done_callback(lambda done: _copy_result(done, future))
+
+        for dependency in dependencies:
+            dependency.add_done_callback(on_dependency_done)
+        return future
+
+    def map(self, fn: Callable, iterable: Iterable) -> List[Future]:
+        """
+        submit(fn, item) for each item, all running side by side.
+        :return: List[Future]:
+        """
+        return [self.submit(fn, item) for item in iterable]
+
+    def _start(self, fn: Callable, args: tuple, kwargs: dict, cache: bool) -> Future:
+        function = _unwrap(fn)
+        module_name, qualname = function.__module__, function.__qualname__
+        key = None
+        if cache:
+            key = hashlib.sha256(pickle.dumps((module_name, qualname, args, kwargs))).hexdigest()
+
+        with self._lock:
+            if key is not None and key in self._results and not self._results[key].cancelled():
+                self._results.move_to_end(key)
+                return self._results[key]
+            future = self._get_pool().submit(_run, module_name, qualname, args, kwargs)
+            if key is not None:
+                self._results[key] = future
+                while len(self._results) > self.max_cached:
+                    self._results.popitem(last=False)
+
+        if key is not None:
+            # Failed and cancelled tasks are not cached, so they can be retried.
+            future.add_done_callback(lambda done: (done.cancelled() or done.exception() is not None)
+                                     and self._forget(key, done))
+        return future
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Call with self._lock held. A pool inherited through fork (e.g. from a gunicorn --preload master) belongs
+        #  to the parent, so this process starts its own.
+        if self._pool is None or self._pool_pid != os.getpid():
+            if self._pool_pid != os.getpid():
+                self._results.clear()  # The parent's futures never complete here.
+            # The pool is first started from request or streaming threads, and forking a threaded process can
+            #  deadlock the child, so start fresh interpreters instead. _run() looks functions up by name.
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_preload, initargs=(self.preload,))
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def start(self) -> None:
+        """
+        Start the worker processes now and wait until they have imported
+        preload, instead of on the first submit().
+        :return: None:
+        """
+        with self._lock:
+            pool = self._get_pool()
+        wait([pool.submit(_preload, ()) for _ in range(self.max_workers)])
+
+    def _forget(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._results.get(key) is future:
+                del self._results[key]
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+def _copy_result(source: Future, target: Future) -> None:
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+_executor = None
+
+
+def get_executor() -> LocalExecutor:
+    """
+    The process-wide executor, created on first use. Its workers import
+    WORKER_MODULES when they start.
+    :return: LocalExecutor:
+    """
+    global _executor
+    if _executor is None:
+        _executor = LocalExecutor(preload=WORKER_MODULES)
+    return _executor
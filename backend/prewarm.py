@@ -0,0 +1,65 @@
+"""
+Author: AmplifiQation
+
+iQuHACK 2023
+
+Optional prewarm hook: import the heavy dependencies and start the executor's
+worker processes, which import the circuit modules, before the first request.
+app.py calls prewarm() when PYROUTE_PREWARM is set.
+
+Usage:
+    python prewarm.py    # prints the import-time report
+"""
+import importlib
+import time
+from typing import Dict, List
+
+# Libraries before our own modules, so each entry only counts what that module adds on top.
+HEAVY_MODULES = ['qiskit', 'qiskit_aer', 'covalent', 'sklearn', 'pandas', 'sqlalchemy', 'psycopg2',
+                 'grover_for_minimization', 'route_solver']
+
+
+def import_report(modules: List[str] = None) -> Dict[str, float]:
+    """
+    Import each module and time it. Modules that are already imported report
+    (close to) zero.
+    :param modules: List[str] (optional; default is HEAVY_MODULES)
+    :return: Dict[str, float]:
+        Seconds spent importing each module; missing modules are left out.
+    """
+    report = {}
+    for name in modules or HEAVY_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        report[name] = time.perf_counter() - start
+    return report
+
+
+def prewarm() -> None:
+    """
+    Import the heavy dependencies here, then start the executor's worker
+    processes and wait for them to import local_executor.WORKER_MODULES.
+    The workers are spawned, not forked, so they need their own imports; the
+    oracles depend on each request's costs and are built there per probe.
+    :return: None:
+    """
+    start = time.perf_counter()
+    for name, seconds in import_report().items():
+        print(f"prewarm: import {name} took {seconds:.3f}s")
+
+    from local_executor import get_executor
+
+    workers_start = time.perf_counter()
+    get_executor().start()
+    print(f"prewarm: executor workers ready in {time.perf_counter() - workers_start:.3f}s")
+
+    print(f"prewarm: done in {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+
+    for module_name, import_seconds in sorted(import_report().items(), key=lambda item: -item[1]):
+        print(f"{module_name:>24} {import_seconds:8.3f}s")
@@ -9,24 +9,51 @@ from math import pi
 from qiskit import QuantumCircuit
 
 
-def qft_rotations(circuit: QuantumCircuit, n: int):
+def _first_control(target: int, n: int, approximation_degree: int) -> int:
+    """
+    Lowest control qubit whose rotation on target survives the approximation,
+    i.e. the smallest qubit with target - qubit <= n - 1 - approximation_degree.
+    """
+    return max(0, target - (n - 1 - approximation_degree))
+
+
+def qft_rotations(circuit: QuantumCircuit, n: int, approximation_degree: int = 0):
     """
     Performs qft on the first n qubits in circuit (without swaps)
     param circuit: QuantumCircuit
     param n: int
         Number of qubits.
+    param approximation_degree: int (optional; default is 0)
+        Drop the controlled phase rotations by angles smaller than
+        pi/2**(n - 1 - approximation_degree), same as qiskit's QFT. 0 gives
+        the exact QFT.
     return None
         Operation is done in place.
     """
-    if n == 0:
-        return circuit
-    n -= 1
-    circuit.h(n)
-    for qubit in range(n):
-        circuit.cp(pi/2**(n-qubit), qubit, n)
-    # At the end of our function, we call the same function again on
-    # the next qubits (we reduced n by one earlier in the function)
-    qft_rotations(circuit, n)
+    # Work down from the most significant qubit, as the textbook recursion does, but without the call stack.
+    for target in reversed(range(n)):
+        circuit.h(target)
+        # Keep the controls within n - 1 - approximation_degree of the target; further ones only add tiny angles.
+        for qubit in range(_first_control(target, n, approximation_degree), target):
+            circuit.cp(pi/2**(target-qubit), qubit, target)
+
+
+def inverse_qft_rotations(circuit: QuantumCircuit, n: int, approximation_degree: int = 0):
+    """
+    Adjoint of qft_rotations(), emitted gate by gate so the caller does not
+    need to build and invert a separate circuit.
+    param circuit: QuantumCircuit
+    param n: int
+        Number of qubits.
+    param approximation_degree: int (optional; default is 0)
+        See qft_rotations().
+    return None
+        Operation is done in place.
+    """
+    for target in range(n):
+        for qubit in reversed(range(_first_control(target, n, approximation_degree), target)):
+            circuit.cp(-pi/2**(target-qubit), qubit, target)
+        circuit.h(target)
 
 
 def swap_registers(circuit: QuantumCircuit, n: int) -> QuantumCircuit:
@@ -43,14 +70,40 @@ def swap_registers(circuit: QuantumCircuit, n: int) -> QuantumCircuit:
     return circuit
 
 
-def qft(circuit: QuantumCircuit, n: int) -> QuantumCircuit:
+def qft(circuit: QuantumCircuit, n: int, approximation_degree: int = 0,
+        do_swaps: bool = True) -> QuantumCircuit:
     """
     QFT on the first n qubits in circuit.
     :param circuit: QuantumCircuit
     :param n: int
         QFT is performed on the first n qubits
+    :param approximation_degree: int (optional; default is 0)
+        See qft_rotations().
+    :param do_swaps: bool (optional; default is True)
+        Set to False to skip the final swaps when the caller keeps track of the
+        reversed qubit order itself.
+    :return: The transformed circuit.
+    """
+    qft_rotations(circuit, n, approximation_degree)
+    if do_swaps:
+        swap_registers(circuit, n)
+    return circuit
+
+
+def inverse_qft(circuit: QuantumCircuit, n: int, approximation_degree: int = 0,
+                do_swaps: bool = True) -> QuantumCircuit:
+    """
+    Inverse QFT on the first n qubits in circuit.
+    :param circuit: QuantumCircuit
+    :param n: int
+        Inverse QFT is performed on the first n qubits
+    :param approximation_degree: int (optional; default is 0)
+        See qft_rotations().
+    :param do_swaps: bool (optional; default is True)
+        Must match the do_swaps used for the forward qft().
     :return: The transformed circuit.
     """
-    qft_rotations(circuit, n)
-    swap_registers(circuit, n)
+    if do_swaps:
+        swap_registers(circuit, n)
+    inverse_qft_rotations(circuit, n, approximation_degree)
     return circuit
@@ -7,10 +7,11 @@ iQuHACK 2023
 
 import os
 import qiskit as qt
-from qiskit import QuantumCircuit, Aer
-from qiskit import IBMQ
+from qiskit import QuantumCircuit
 import covalent as ct
 
+from execution_policy import ExecutionPolicy
+
 
 class RNG:
     """
@@ -21,6 +22,7 @@ class RNG:
         2 for Aer Local Sim
     """
     backend: int
+    local_sim: bool
 
     def __init__(self, backend: int, token: str) -> None:
         """
@@ -31,6 +33,15 @@ class RNG:
             IBM API to connect to QC
         :return: None:
         """
+        self.local_sim = backend not in (0, 1)
+        if self.local_sim:
+            # The Aer simulator is configured per circuit, see randomizer_circuit().
+            self.backend = None
+            return
+
+        # Only the IBMQ backends pay for importing the provider.
+        from qiskit import IBMQ
+
         IBMQ.save_account(token)
         IBMQ.load_account()
         provider = IBMQ.get_provider(hub='ibm-q')
@@ -38,8 +49,6 @@ class RNG:
             self.backend = provider.get_backend('ibm_nairobi')
         elif backend == 1:
             self.backend = provider.get_backend('simulator_stabilizer')
-        else:
-            self.backend = Aer.get_backend('qasm_simulator')
 
     @ct.electron
     def randomizer_circuit(self, num_qubits: int) -> int:
@@ -58,6 +67,13 @@ class RNG:
 
         # circuit.draw(output='mpl')
 
-        job = qt.execute(circuit, backend=self.backend, shots=1)
+        backend = self.backend
+        if self.local_sim:
+            # A Hadamard-and-measure circuit is Clifford, so this picks the stabilizer method.
+            policy = ExecutionPolicy(circuit, shots=1)
+            print(policy)
+            backend = policy.simulator()
+
+        job = qt.execute(circuit, backend=backend, shots=1)
         counts = job.result().get_counts()
         return int(list(counts)[0], 2)
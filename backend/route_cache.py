@@ -0,0 +1,271 @@
+"""
+Author: AmplifiQation
+
+iQuHACK 2023
+
+Cache of solved routes, keyed by the normalised problem instance.
+
+An in-process LRU sits in front of a durable store (a Postgres table, or JSON
+files as a stand-in). Keys include a fingerprint of the location catalogue, so
+editing the catalogue invalidates every cached route.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+
+# path -> (mtime_ns, size, digest), so an unchanged catalogue is not re-hashed on every request.
+_catalogue_versions = {}
+
+
+def catalogue_version(path: str) -> str:
+    """
+    Fingerprint of the location catalogue file.
+    :param path: str
+        Path to the catalogue.
+    :return: str:
+        Hex digest of the file contents.
+    """
+    stat = os.stat(path)
+    cached = _catalogue_versions.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _catalogue_versions[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def instance_key(location_ids: List[int], options: Dict, catalogue: str) -> str:
+    """
+    Canonical hash of a route request. The route is a round trip, so the order
+    of location_ids does not matter; unset options are ignored.
+    :param location_ids: List[int]
+    :param options: Dict
+        Solver options.
+    :param catalogue: str
+        Catalogue version, see catalogue_version().
+    :return: str:
+        Hex digest identifying the instance.
+    """
+    instance = {'locations': sorted(set(location_ids)),
+                'options': {name: value for name, value in options.items() if value is not None},
+                'catalogue': catalogue}
+    return hashlib.sha256(json.dumps(instance, sort_keys=True).encode()).hexdigest()
+
+
+class FileRouteStore:
+    """
+    Durable store keeping one JSON file per route.
+    directory: str
+        Where the files live.
+    """
+    directory: str
+
+    def __init__(self, directory: str) -> None:
+        """
+        Initializes the store, creating directory if needed.
+        :param directory: str
+        :return: None:
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        :return: Optional[Dict]:
+            The stored record ('created', 'catalogue', 'result'), or None.
+        """
+        try:
+            with open(self._path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, record: Dict) -> None:
+        # Write to a temporary file first, so readers never see half a record.
+        tmp_path = self._path(key) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def purge(self, keep_catalogue: Optional[str] = None) -> None:
+        """
+        Delete every record not built from keep_catalogue (all of them if None).
+        :return: None:
+        """
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-len('.json')]
+            record = self.get(key)
+            if keep_catalogue is None or record is None or record.get('catalogue') != keep_catalogue:
+                self.delete(key)
+
+
+class PostgresRouteStore:
+    """
+    Durable store keeping routes in the route_cache table.
+    connect: Callable
+        Returns a new psycopg2 connection, e.g. app.get_db_connection.
+    """
+    connect: Callable
+
+    def __init__(self, connect: Callable) -> None:
+        """
+        Initializes the store, creating the table if needed.
+        :param connect: Callable
+        :return: None:
+        """
+        self.connect = connect
+        self._execute('CREATE TABLE IF NOT EXISTS route_cache ('
+                      'key text PRIMARY KEY, catalogue text NOT NULL, '
+                      'created double precision NOT NULL, result text NOT NULL);')
+
+    def _execute(self, query: str, params: tuple = ()) -> Optional[tuple]:
+        conn = self.connect()
+        try:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                    return cur.fetchone() if cur.description else None
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Dict]:
+        row = self._execute('SELECT created, catalogue, result FROM route_cache WHERE key = %s;', (key,))
+        if row is None:
+            return None
+        return {'created': row[0], 'catalogue': row[1], 'result': json.loads(row[2])}
+
+    def put(self, key: str, record: Dict) -> None:
+        self._execute('INSERT INTO route_cache (key, catalogue, created, result) VALUES (%s, %s, %s, %s) '
+                      'ON CONFLICT (key) DO UPDATE SET catalogue = EXCLUDED.catalogue, '
+                      'created = EXCLUDED.created, result = EXCLUDED.result;',
+                      (key, record['catalogue'], record['created'], json.dumps(record['result'])))
+
+    def delete(self, key: str) -> None:
+        self._execute('DELETE FROM route_cache WHERE key = %s;', (key,))
+
+    def purge(self, keep_catalogue: Optional[str] = None) -> None:
+        if keep_catalogue is None:
+            self._execute('DELETE FROM route_cache;')
+        else:
+            self._execute('DELETE FROM route_cache WHERE catalogue <> %s;', (keep_catalogue,))
+
+
+class RouteCache:
+    """
+    LRU of solved routes in front of a durable store.
+    store: FileRouteStore or PostgresRouteStore
+    max_entries: int
+        Size of the in-process LRU.
+    ttl: float
+        Seconds a route stays valid; None for no expiry.
+    catalogue: str
+        Catalogue version the cached routes were built from.
+    """
+    max_entries: int
+    ttl: Optional[float]
+    catalogue: Optional[str]
+
+    def __init__(self, store, max_entries: int = 256, ttl: Optional[float] = 24 * 60 * 60) -> None:
+        """
+        Initializes the cache.
+        :return: None:
+        """
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.catalogue = None
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, record: Dict) -> bool:
+        return self.ttl is not None and time.time() - record['created'] > self.ttl
+
+    def set_catalogue(self, catalogue: str) -> None:
+        """
+        Record the current catalogue version, dropping every route built from
+        another one.
+        :param catalogue: str
+        :return: None:
+        """
+        with self._lock:
+            if catalogue == self.catalogue:
+                return
+            self._lru.clear()
+            self.catalogue = catalogue
+        self.store.purge(keep_catalogue=catalogue)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        :param key: str
+            See instance_key().
+        :return: Optional[Dict]:
+            The cached route, or None on a miss.
+        """
+        with self._lock:
+            record = self._lru.get(key)
+            if record is not None:
+                self._lru.move_to_end(key)
+
+        if record is None:
+            record = self.store.get(key)
+            if record is None or record['catalogue'] != self.catalogue:
+                return None
+            self._remember(key, record)
+
+        if self._expired(record):
+            self.invalidate(key)
+            return None
+        return record['result']
+
+    def put(self, key: str, result: Dict) -> None:
+        """
+        Cache a solved route.
+        :param key: str
+            See instance_key().
+        :param result: Dict
+            Must be JSON serialisable.
+        :return: None:
+        """
+        record = {'created': time.time(), 'catalogue': self.catalogue, 'result': result}
+        self.store.put(key, record)
+        self._remember(key, record)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Drop one cached route, or all of them if key is None.
+        :return: None:
+        """
+        with self._lock:
+            if key is None:
+                self._lru.clear()
+            else:
+                self._lru.pop(key, None)
+        if key is None:
+            self.store.purge()
+        else:
+            self.store.delete(key)
+
+    def _remember(self, key: str, record: Dict) -> None:
+        with self._lock:
+            self._lru[key] = record
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
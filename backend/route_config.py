@@ -0,0 +1,44 @@
+"""
+Author: AmplifiQation
+
+iQuHACK 2023
+
+Route request settings shared by app.py and route_solver.py. Kept free of
+heavy imports, so that serving a cached route does not load the solver.
+"""
+import os
+from typing import Dict
+
+# The location catalogue, one row per location.
+LOCATIONS_CSV = os.environ.get('PYROUTE_LOCATIONS',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'out.csv'))
+
+# Most locations a request may ask for. n locations have (n - 1)! round trips and each one is a data qubit of the
+#  Grover circuit, so 4 (6 round trips, about 11 qubits) is what a simulator answers promptly.
+MAX_LOCATIONS = int(os.environ.get('PYROUTE_MAX_LOCATIONS', 4))
+
+# Solver options accepted by route_solver.solve_route(), with their types. max_distance is in metres.
+SOLVER_OPTIONS = {'k_nearest': int, 'max_distance': float, 'pivots_per_round': int, 'approximation_degree': int}
+
+# Largest pivots_per_round a request may ask for; each pivot is one more circuit to build and run per round.
+MAX_PIVOTS_PER_ROUND = 7
+
+
+def validate_options(options: Dict) -> Dict:
+    """
+    Check the solver options of a request, clamping pivots_per_round to
+    MAX_PIVOTS_PER_ROUND. Unset options are None.
+    :param options: Dict
+        Solver options, see SOLVER_OPTIONS.
+    :return: Dict:
+        The options, modified in place.
+    """
+    if options.get('pivots_per_round') is not None:
+        if options['pivots_per_round'] < 1:
+            raise ValueError("pivots_per_round must be at least 1")
+        options['pivots_per_round'] = min(options['pivots_per_round'], MAX_PIVOTS_PER_ROUND)
+    if options.get('max_distance') is not None and options['max_distance'] <= 0:
+        raise ValueError("max_distance must be a positive number of metres")
+    if options.get('approximation_degree') is not None and options['approximation_degree'] < 0:
+        raise ValueError("approximation_degree must be at least 0")
+    return options
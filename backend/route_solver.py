@@ -0,0 +1,165 @@
+"""
+Author: AmplifiQation
+
+iQuHACK 2023
+
+Solve a route over a set of catalogue locations: enumerate the Hamiltonian
+cycles, then find the cheapest one with the Durr & Hoyer minimization.
+"""
+import queue
+import threading
+from typing import Dict, Iterator, List, Tuple
+
+from DataManager import DataManager
+from grover_enhanced_minimization import grover_enhanced_minimization
+from local_executor import get_executor
+from route_config import LOCATIONS_CSV
+
+# Mean Earth radius, to turn haversine distances (radians) into metres.
+EARTH_RADIUS_M = 6371000
+
+
+def _enumerate_cycles(location_ids: List[int], options: Dict) -> Tuple[List[str], List[int]]:
+    """
+    Enumerate the candidate round trips and their costs.
+    :return: Tuple[List[str], List[int]]:
+        The cycles (as strings of stop positions) and their costs in whole
+        metres.
+    """
+    # max_distance is given in metres, the cost matrix is in radians.
+    max_distance = options.get('max_distance')
+    if max_distance is not None:
+        max_distance = max_distance / EARTH_RADIUS_M
+
+    data_manager = DataManager(LOCATIONS_CSV, executor=get_executor())
+    cycles = data_manager.build_hamiltonian_cycle_dict(n_events=len(location_ids), location_ids=location_ids,
+                                                       k_nearest=options.get('k_nearest'),
+                                                       max_distance=max_distance)
+    if not cycles:
+        raise ValueError("no route visits every location")
+
+    costs = [max(1, round(cost * EARTH_RADIUS_M)) for cost in cycles.values()]
+    return list(cycles), costs
+
+
+def cost_ranks(costs: List[int]) -> Tuple[List[int], List[int]]:
+    """
+    Replace each cost by its rank among the distinct costs, starting at 1.
+    The oracle needs log2(sum(arr)) ancillary qubits and one sign-flip block
+    per value below the pivot, so we minimize the ranks (at most len(costs))
+    rather than the costs in metres.
+    :param costs: List[int]
+    :return: Tuple[List[int], List[int]]:
+        The rank of each cost, and the distinct costs in ascending order
+        (rank r is distinct_costs[r - 1]).
+    """
+    distinct_costs = sorted(set(costs))
+    rank_of = {cost: rank for rank, cost in enumerate(distinct_costs, start=1)}
+    return [rank_of[cost] for cost in costs], distinct_costs
+
+
+def _route(location_ids: List[int], cycles: List[str], ranks: List[int], distinct_costs: List[int],
+           rank: int) -> Dict:
+    cycle = cycles[ranks.index(rank)]
+    return {'route': [location_ids[int(stop)] for stop in cycle.split(" ")],
+            'cost_m': distinct_costs[rank - 1]}
+
+
+def _minimization_options(options: Dict) -> Dict:
+    """
+    The solver options that go to grover_enhanced_minimization(), with defaults
+    for the unset ones.
+    """
+    pivots_per_round = options.get('pivots_per_round')
+    approximation_degree = options.get('approximation_degree')
+    return {'pivots_per_round': 1 if pivots_per_round is None else pivots_per_round,
+            'approximation_degree': 0 if approximation_degree is None else approximation_degree}
+
+
+def solve_route(location_ids: List[int], options: Dict = None) -> Dict:
+    """
+    Find the cheapest round trip through the given locations.
+    :param location_ids: List[int]
+        Catalogue ids of the locations to visit. The route starts and ends at
+        the first one.
+    :param options: Dict (optional; default is None)
+        Solver options, see route_config.SOLVER_OPTIONS.
+    :return: Dict:
+        'route': the location ids in visiting order,
+        'cost_m': the length of the route in metres.
+    """
+    options = options or {}
+    cycles, costs = _enumerate_cycles(location_ids, options)
+    ranks, distinct_costs = cost_ranks(costs)
+
+    best_rank = grover_enhanced_minimization(arr=ranks, executor=get_executor(), **_minimization_options(options))
+    return _route(location_ids, cycles, ranks, distinct_costs, best_rank)
+
+
+def iter_route(location_ids: List[int], options: Dict = None) -> Iterator[Dict]:
+    """
+    Like solve_route(), but yields every improved route as the minimization
+    tightens its bound, starting with the first enumerated cycle. The last
+    route yielded has 'final' set to True.
+
+    The minimization runs in a background thread. Closing the generator (e.g.
+    when the client disconnects) stops it before its next round of probes.
+    :param location_ids: List[int]
+    :param options: Dict (optional; default is None)
+    :return: Iterator[Dict]:
+        Routes as returned by solve_route(), plus 'final': bool.
+    """
+    options = options or {}
+    cycles, costs = _enumerate_cycles(location_ids, options)
+    ranks, distinct_costs = cost_ranks(costs)
+
+    # ('improvement' | 'final', rank) or ('error', exception), in order.
+    events = queue.Queue()
+    cancelled = threading.Event()
+
+    def on_improvement(rank: int) -> None:
+        events.put(('improvement', rank))
+
+    def minimize() -> None:
+        try:
+            events.put(('final', grover_enhanced_minimization(arr=ranks, on_improvement=on_improvement,
+                                                              should_stop=cancelled.is_set, executor=get_executor(),
+                                                              **_minimization_options(options))))
+        except Exception as e:
+            events.put(('error', e))
+
+    threading.Thread(target=minimize, daemon=True).start()
+    try:
+        while True:
+            kind, value = events.get()
+            if kind == 'error':
+                raise value
+            # The consumer may modify the route (app.py pops 'final'), so keep the flag here.
+            final = kind == 'final'
+            route = _route(location_ids, cycles, ranks, distinct_costs, value)
+            route['final'] = final
+            yield route
+            if final:
+                return
+    finally:
+        cancelled.set()
+
+
+if __name__ == "__main__":
+
+    # End-to-end check on a small instance: the solver must return the cheapest enumerated round trip.
+    location_ids_ = [0, 1, 2, 3]
+    _, costs_ = _enumerate_cycles(location_ids_, {})
+    route_ = solve_route(location_ids_)
+    print("Route: " + str(route_))
+    assert route_['cost_m'] == min(costs_), "expected " + str(min(costs_)) + " m, got " + str(route_['cost_m'])
+    assert sorted(route_['route'][:-1]) == location_ids_ and route_['route'][0] == route_['route'][-1]
+
+    # Consume the stream the way app.py does, popping 'final' from each route.
+    streamed_ = []
+    for streamed_route_ in iter_route(location_ids_):
+        streamed_.append((streamed_route_.pop('final'), streamed_route_))
+    finals_ = [final for final, _ in streamed_]
+    assert finals_.count(True) == 1 and finals_[-1], "the stream must end with exactly one final route"
+    assert streamed_[-1][1]['cost_m'] == min(costs_), "streamed " + str(streamed_[-1][1]) + ", not the cheapest"
+    print("OK")